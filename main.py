@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
 from pathlib import Path
+import os
+import tempfile
 import unicodedata
 import io
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 import plotly.express as px
 import plotly.graph_objects as go
@@ -17,42 +21,104 @@ st.set_page_config(
 )
 
 # 한글 폰트 (Streamlit UI)
-st.markdown("""
+FONT_CSS = """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR&display=swap');
 html, body, [class*="css"] {
     font-family: 'Noto Sans KR', 'Malgun Gothic', sans-serif;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(FONT_CSS, unsafe_allow_html=True)
 
 # Plotly 폰트용 공통 설정
 PLOTLY_FONT = dict(family="Malgun Gothic, Apple SD Gothic Neo, sans-serif")
 
+# 산점도에 그릴 최대 점 개수 (초과 시 표본 추출)
+RENDER_LIMIT = 5000
+
+# 학교별 EC 조건
+EC_MAP = {
+    "송도고": 1.0,
+    "하늘고": 2.0,
+    "아라고": 4.0,
+    "동산고": 8.0
+}
+
 DATA_DIR = Path("data")
+CACHE_DIR = DATA_DIR / ".cache"
+# 파싱 방식이나 열 구성이 바뀌면 올려서 이전 캐시 파일을 무효화
+CACHE_VERSION = 2
 
 # -----------------------------
 # 유틸 함수: 한글 파일 탐색
 # -----------------------------
+def _to_nfc(name: str) -> str:
+    # ASCII 이름은 정규화 결과가 동일하므로 바로 반환
+    if name.isascii():
+        return name
+    return unicodedata.normalize("NFC", name)
+
+@lru_cache(maxsize=None)
+def _index_dir(directory: Path):
+    # 폴더를 한 번만 훑어 NFC 이름 -> 파일 경로 사전 생성
+    return {_to_nfc(f.name): f for f in directory.iterdir()}
+
 def find_file_by_name(directory: Path, target_name: str):
     if not directory.exists():
         return None
 
-    target_nfc = unicodedata.normalize("NFC", target_name)
-    target_nfd = unicodedata.normalize("NFD", target_name)
-
-    for f in directory.iterdir():
-        name_nfc = unicodedata.normalize("NFC", f.name)
-        name_nfd = unicodedata.normalize("NFD", f.name)
-        if name_nfc == target_nfc or name_nfd == target_nfd:
-            return f
-    return None
+    return _index_dir(directory).get(_to_nfc(target_name))
 
 # -----------------------------
 # 데이터 로딩
 # -----------------------------
-@st.cache_data
-def load_env_data():
+ENV_DTYPES = {
+    "time": "string",
+    "temperature": "float64",
+    "humidity": "float64",
+    "ph": "float64",
+    "ec": "float64",
+}
+
+def read_env_csv(file_path: Path):
+    df = pd.read_csv(
+        file_path,
+        engine="pyarrow",
+        usecols=list(ENV_DTYPES),
+        dtype=ENV_DTYPES
+    )
+    # 학교마다 시간 표기 형식이 달라 형식 혼합 파싱
+    df["time"] = pd.to_datetime(df["time"], format="mixed")
+    return df
+
+def read_with_parquet_cache(src: Path, cache_name: str, parse):
+    # 원본보다 최신인 parquet 캐시가 있으면 재파싱 없이 사용
+    cache_path = CACHE_DIR / f"{cache_name}_v{CACHE_VERSION}.parquet"
+    try:
+        if cache_path.stat().st_mtime >= src.stat().st_mtime:
+            return pd.read_parquet(cache_path, engine="pyarrow")
+    except Exception:
+        pass  # 캐시가 없거나 손상된 경우 원본을 다시 파싱
+
+    df = parse(src)
+
+    # 임시 파일에 다 쓴 뒤 교체해 반쯤 쓰인 캐시가 읽히지 않도록 함
+    tmp_path = None
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        # 쓰기 불가능한 환경이거나 parquet 변환이 안 되는 열이 있으면 캐시 없이 진행
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+    return df
+
+def find_env_files():
     school_files = {
         "송도고": "송도고_환경데이터.csv",
         "하늘고": "하늘고_환경데이터.csv",
@@ -60,33 +126,66 @@ def load_env_data():
         "동산고": "동산고_환경데이터.csv",
     }
 
-    data = {}
+    paths = {}
     for school, fname in school_files.items():
         file_path = find_file_by_name(DATA_DIR, fname)
         if file_path is None:
             st.error(f"❌ 환경 데이터 파일을 찾을 수 없습니다: {fname}")
             continue
+        paths[school] = file_path
+    return paths
 
-        df = pd.read_csv(file_path)
-        df["학교"] = school
-        data[school] = df
+# 로더는 학교 통합 데이터 한 개를 공유 객체로 캐시하므로 반환값을 직접 수정하지 말 것
+@st.cache_resource
+def load_env_data(paths):
+    def read_school(school):
+        return read_with_parquet_cache(paths[school], f"env_{school}", read_env_csv)
 
-    return data
+    # CSV 파싱은 GIL을 해제하므로 학교별 파일을 병렬로 읽음
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        frames = dict(zip(paths, pool.map(read_school, paths)))
 
-@st.cache_data
+    # 학교 열은 범주형으로 저장해 문자열 객체 대신 정수 코드만 보관
+    schools = list(frames)
+    for school, df in frames.items():
+        df["학교"] = pd.Categorical([school] * len(df), categories=schools)
+
+    return pd.concat(frames.values(), ignore_index=True)
+
+@st.cache_resource
 def load_growth_data():
     file_path = find_file_by_name(DATA_DIR, "4개교_생육결과데이터.xlsx")
     if file_path is None:
         st.error("❌ 생육 결과 XLSX 파일을 찾을 수 없습니다.")
-        return {}
+        return None
 
-    xls = pd.ExcelFile(file_path)
-    data = {}
-    for sheet in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet)
-        df["학교"] = sheet
-        data[sheet] = df
-    return data
+    def parse(path):
+        # sheet_name=None 으로 통합문서를 한 번만 파싱해 모든 시트를 읽음
+        sheets = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+        return pd.concat(
+            [df.assign(학교=sheet) for sheet, df in sheets.items()],
+            ignore_index=True
+        )
+
+    merged = read_with_parquet_cache(file_path, "growth", parse)
+    merged["학교"] = pd.Categorical(merged["학교"], categories=merged["학교"].unique())
+    return merged
+
+# -----------------------------
+# 집계 함수
+# -----------------------------
+@st.cache_data
+def growth_summary(growth_all):
+    sum_df = (
+        growth_all.groupby("학교", observed=True, sort=False)
+        .agg(**{
+            "평균 지상부 길이(mm)": ("지상부 길이(mm)", "mean"),
+            "평균 지하부 길이(mm)": ("지하부길이(mm)", "mean")
+        })
+        .reset_index()
+    )
+    sum_df.insert(1, "EC", sum_df["학교"].map(EC_MAP).astype(float))
+    return sum_df
 
 # -----------------------------
 # 데이터 로딩
@@ -95,17 +194,18 @@ if not DATA_DIR.exists():
     st.error("❌ data/ 폴더를 찾을 수 없습니다. GitHub에 업로드되어 있는지 확인하세요.")
     st.stop()
 
+env_paths = find_env_files()
+
 with st.spinner("데이터 로딩 중..."):
-    env_data = load_env_data()
-    growth_data = load_growth_data()
+    growth_all = load_growth_data()
 
-if not env_data or not growth_data:
+if not env_paths or growth_all is None:
     st.stop()
 
 # -----------------------------
 # 사이드바
 # -----------------------------
-schools = ["전체"] + sorted(env_data.keys())
+schools = ["전체"] + sorted(env_paths.keys())
 selected_school = st.sidebar.selectbox("학교 선택", schools)
 
 st.title("📊 EC값에 따른 상하부 길이의 성장률 차이")
@@ -113,40 +213,38 @@ st.title("📊 EC값에 따른 상하부 길이의 성장률 차이")
 # -----------------------------
 # 탭 구성
 # -----------------------------
-tab1, tab2, tab3 = st.tabs([
+# st.tabs 는 모든 탭 본문을 매번 실행하므로 선택된 화면만 그림
+TAB_LABELS = [
     "📘 학교별 평균 환경데이터 & 이탈값",
     "📈 EC값에 따른 성장량 (학교별)",
     "🔗 EC–지상부/지하부 관계"
-])
+]
+view = st.sidebar.radio("화면 선택", TAB_LABELS)
 
 # ======================================================
 # TAB 1
 # ======================================================
-with tab1:
-    rows = []
-    outliers = []
-
-    for school, df in env_data.items():
-        rows.append({
-            "학교": school,
-            "평균 온도": df["temperature"].mean(),
-            "평균 습도": df["humidity"].mean(),
-            "평균 pH": df["ph"].mean(),
-            "평균 EC": df["ec"].mean()
+if view == TAB_LABELS[0]:
+    with st.spinner("데이터 로딩 중..."):
+        env_all = load_env_data(env_paths)
+
+    avg_df = (
+        env_all.groupby("학교", observed=True, sort=False)
+        .agg(**{
+            "평균 온도": ("temperature", "mean"),
+            "평균 습도": ("humidity", "mean"),
+            "평균 pH": ("ph", "mean"),
+            "평균 EC": ("ec", "mean")
         })
+        .reset_index()
+    )
 
-        # 물리적으로 말이 안 되는 값 체크
-        invalid = df[
-            (df["ph"] < 0) | (df["ph"] > 14) |
-            (df["humidity"] < 0) | (df["humidity"] > 100) |
-            (df["ec"] < 0)
-        ]
-        if not invalid.empty:
-            invalid = invalid.copy()
-            invalid["학교"] = school
-            outliers.append(invalid)
-
-    avg_df = pd.DataFrame(rows)
+    # 물리적으로 말이 안 되는 값 체크
+    ph = env_all["ph"].to_numpy()
+    hum = env_all["humidity"].to_numpy()
+    ec = env_all["ec"].to_numpy()
+    invalid_mask = (ph < 0) | (ph > 14) | (hum < 0) | (hum > 100) | (ec < 0)
+    out_df = env_all[invalid_mask]
 
     st.subheader("학교별 평균 환경 데이터")
     st.dataframe(avg_df, use_container_width=True)
@@ -161,34 +259,17 @@ with tab1:
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    if outliers:
+    if not out_df.empty:
         st.subheader("⚠️ 환경 데이터 이탈값")
-        out_df = pd.concat(outliers)
         st.dataframe(out_df, use_container_width=True)
 
 # ======================================================
 # TAB 2
 # ======================================================
-with tab2:
+elif view == TAB_LABELS[1]:
     st.subheader("학교별 EC 조건에서의 성장량")
 
-    ec_map = {
-        "송도고": 1.0,
-        "하늘고": 2.0,
-        "아라고": 4.0,
-        "동산고": 8.0
-    }
-
-    summary = []
-    for school, df in growth_data.items():
-        summary.append({
-            "학교": school,
-            "EC": ec_map.get(school, None),
-            "평균 지상부 길이(mm)": df["지상부 길이(mm)"].mean(),
-            "평균 지하부 길이(mm)": df["지하부길이(mm)"].mean()
-        })
-
-    sum_df = pd.DataFrame(summary)
+    sum_df = growth_summary(growth_all)
 
     fig = make_subplots(
         rows=1, cols=2,
@@ -223,25 +304,26 @@ with tab2:
 # ======================================================
 # TAB 3
 # ======================================================
-with tab3:
+elif view == TAB_LABELS[2]:
     st.subheader("EC값에 따른 지상부–지하부 관계")
 
-    all_rows = []
-    for school, df in growth_data.items():
-        ec = ec_map.get(school, None)
-        temp = df.copy()
-        temp["EC"] = ec
-        all_rows.append(temp)
+    merged = growth_all.assign(EC=growth_all["학교"].map(EC_MAP).astype(float))
 
-    merged = pd.concat(all_rows, ignore_index=True)
+    title = "지상부 길이 vs 지하부 길이"
+    if len(merged) > RENDER_LIMIT:
+        plot_df = merged.sample(n=RENDER_LIMIT, random_state=0)
+        title += f" (표본 {RENDER_LIMIT:,}개)"
+    else:
+        plot_df = merged
 
     fig1 = px.scatter(
-        merged,
+        plot_df,
         x="지상부 길이(mm)",
         y="지하부길이(mm)",
         color="EC",
         hover_data=["학교"],
-        title="지상부 길이 vs 지하부 길이"
+        title=title,
+        render_mode="webgl"
     )
     fig1.update_layout(font=PLOTLY_FONT)
 